@@ -0,0 +1,63 @@
+import argparse
+import os
+import time
+import numpy as np
+import faiss
+from core.shard import ShardedFaceIndex
+
+def random_gallery(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype('float32')
+    faiss.normalize_L2(vecs)
+    return vecs
+
+def time_queries(search, queries, batch):
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        search(queries[i:i + batch])
+    return len(queries) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Gallery search throughput vs number of shards")
+    parser.add_argument("--gallery", type=int, default=500_000, help="number of stored embeddings")
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--batch", type=int, default=64, help="queries sent per fan-out")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads-per-shard", type=int, default=1, help="OpenMP threads inside each worker")
+    args = parser.parse_args()
+
+    dim = 512
+    gallery = random_gallery(args.gallery, dim)
+    queries = random_gallery(args.queries, dim, seed=1)
+    known_faces = list(zip(range(1, args.gallery + 1), gallery))
+
+    # Baselines: the single in-process index FaceEngine uses without SEARCH_SHARDS,
+    # with FAISS's default OpenMP threads (what main.py really runs) and pinned to one thread
+    index = faiss.IndexFlatIP(dim)
+    index.add(gallery)
+    omp_threads = faiss.omp_get_max_threads()
+    base_qps = time_queries(lambda q: index.search(q, args.k), queries, args.batch)
+    faiss.omp_set_num_threads(1)
+    single_qps = time_queries(lambda q: index.search(q, args.k), queries, args.batch)
+    faiss.omp_set_num_threads(omp_threads)
+
+    print(f"gallery={args.gallery} queries={args.queries} batch={args.batch} k={args.k} "
+          f"threads/shard={args.threads_per_shard} cpus={os.cpu_count()}")
+    print(f"in-process, {omp_threads:>2} threads: {base_qps:10.1f} q/s")
+    print(f"in-process,  1 thread : {single_qps:10.1f} q/s")
+
+    for n in args.shards:
+        shards = ShardedFaceIndex(n, dim, threads_per_shard=args.threads_per_shard)
+        try:
+            shards.build(known_faces)
+            shards.search(queries[:args.batch], args.k)  # warm-up
+            qps = time_queries(lambda q: shards.search(q, args.k), queries, args.batch)
+            rss = ", ".join("?" if mb is None else f"{mb:.0f}" for mb in shards.memory_usage())
+            print(f"{n:>2} shards            : {qps:10.1f} q/s  ({qps / base_qps:.2f}x default, "
+                  f"{qps / single_qps:.2f}x 1-thread)  worker RSS MB: [{rss}]")
+        finally:
+            shards.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import numpy as np
 from insightface.app import FaceAnalysis
 import faiss
+from core.shard import ShardedFaceIndex
 
 class FaceEngine:
-    def __init__(self, model_name='buffalo_s'):
+    def __init__(self, model_name='buffalo_s', num_shards=0, threads_per_shard=1, db_path=None):
         # Initialize InsightFace
         self.app = FaceAnalysis(name=model_name, providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
         self.app.prepare(ctx_id=0, det_size=(640, 640))
@@ -13,6 +14,10 @@ class FaceEngine:
         self.index = faiss.IndexFlatIP(512)
         self.id_map = []  # Maps FAISS index position to Database person_id
 
+        # Optional: partition the gallery across worker processes for very large identity sets
+        # Shard workers read their partitions from db_path themselves (see load_shards)
+        self.shards = ShardedFaceIndex(num_shards, threads_per_shard=threads_per_shard, db_path=db_path) if num_shards > 0 else None
+
     def get_face_features(self, frame):
         faces = self.app.get(frame)
         results = []
@@ -38,6 +43,9 @@ class FaceEngine:
         """Rebuilds the FAISS index from the database records."""
         if not known_faces:
             return
+        if self.shards:
+            self.shards.build(known_faces)
+            return
         
         embeddings = np.array([f[1] for f in known_faces]).astype('float32')
         # Normalize all for dot-product similarity
@@ -46,7 +54,59 @@ class FaceEngine:
         self.index = faiss.IndexFlatIP(512)
         self.index.add(embeddings)
         self.id_map = [f[0] for f in known_faces]
-        
+
+    def load_shards(self):
+        """Sharded counterpart of update_search_index: each worker loads its own rows from the database."""
+        self.shards.load()
+
+    def rebuild_shard(self, shard):
+        """Reloads one shard from the database, e.g. after editing rows outside the change log."""
+        self.shards.rebuild_shard(shard)
+
+    def restart_shard(self, shard):
+        """Replaces a crashed shard worker (see ShardError.shard) and reloads its partition."""
+        self.shards.restart_shard(shard)
+
+    def add_faces(self, person_id, embeddings):
+        """Appends embeddings for person_id without rebuilding the index."""
+        if not embeddings:
+            return
+        if self.shards:
+            self.shards.add_faces(person_id, embeddings)
+            return
+        vecs = np.array(embeddings).astype('float32')
+        faiss.normalize_L2(vecs)
+        self.index.add(vecs)
+        self.id_map.extend([person_id] * len(vecs))
+
+    def remove_person(self, person_id):
+        """Drops every embedding of person_id. IndexFlat compacts in order, so id_map stays aligned."""
+        if self.shards:
+            self.shards.remove_person(person_id)
+            return
+        positions = [i for i, pid in enumerate(self.id_map) if pid == person_id]
+        if not positions:
+            return
+        self.index.remove_ids(np.array(positions, dtype='int64'))
+        self.id_map = [pid for pid in self.id_map if pid != person_id]
+
+    def relabel_person(self, old_id, new_id):
+        """Reassigns old_id's embeddings to new_id (a merge). In-process this is a pure relabel;
+        when sharded the vectors move to new_id's shard."""
+        if self.shards:
+            self.shards.relabel_person(old_id, new_id)
+            return
+        self.id_map = [new_id if pid == old_id else pid for pid in self.id_map]
+
+    def has_person(self, person_id):
+        if self.shards:
+            return self.shards.has_person(person_id)
+        return person_id in self.id_map
+
+    def close(self):
+        if self.shards:
+            self.shards.close()
+
     def compute_similarity(self, emb1, emb2):
         """Computes cosine similarity between two embeddings."""
         emb1_norm = emb1 / np.linalg.norm(emb1)
@@ -55,10 +115,19 @@ class FaceEngine:
 
     def search_face(self, query_embedding, threshold=0.45):
         """Returns (person_id, score) using FAISS"""
+        query_vec = query_embedding.reshape(1, -1).astype('float32')
+        if self.shards:
+            if self.shards.ntotal == 0:
+                return None, 0
+            scores, labels = self.shards.search(query_vec, 1)
+            score, person_id = scores[0][0], int(labels[0][0])
+            if person_id != -1 and score >= threshold:
+                return person_id, score
+            return None, score
+
         if self.index.ntotal == 0:
             return None, 0
         
-        query_vec = query_embedding.reshape(1, -1).astype('float32')
         distances, indices = self.index.search(query_vec, 1)
         
         score = distances[0][0]
@@ -0,0 +1,340 @@
+import os
+import subprocess
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+import numpy as np
+import faiss
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ShardError(RuntimeError):
+    def __init__(self, message, shard=None):
+        super().__init__(message)
+        self.shard = shard
+
+def _rss_mb():
+    """Resident memory of this process in MB, None if it can't be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _shard_worker(conn, dim, threads):
+    """Owns one partition of the gallery. Every request gets exactly one reply."""
+    faiss.omp_set_num_threads(threads)
+    index = faiss.IndexFlatIP(dim)
+    # Kept as an int64 array so search can map positions to person_ids without a per-query copy
+    id_map = np.zeros(0, dtype='int64')
+
+    while True:
+        try:
+            cmd, args = conn.recv()
+        except EOFError:
+            break  # Parent went away
+        if cmd == 'load':
+            # Read this shard's rows straight from SQLite, the parent never holds the gallery
+            import db
+            db.DB_PATH, shard, num_shards = args
+            rows = db.get_known_faces_partition(shard, num_shards)
+            index = faiss.IndexFlatIP(dim)
+            id_map = np.array([pid for pid, _ in rows], dtype='int64')
+            if rows:
+                vecs = np.ascontiguousarray(np.array([emb for _, emb in rows], dtype='float32'))
+                del rows
+                faiss.normalize_L2(vecs)
+                index.add(vecs)
+            conn.send(dict(Counter(id_map.tolist())))
+        elif cmd == 'build':
+            ids, vecs = args
+            index = faiss.IndexFlatIP(dim)
+            if len(ids):
+                index.add(vecs)
+            id_map = np.array(ids, dtype='int64')
+            conn.send(index.ntotal)
+        elif cmd == 'add':
+            person_id, vecs = args
+            index.add(vecs)
+            id_map = np.concatenate([id_map, np.full(len(vecs), person_id, dtype='int64')])
+            conn.send(index.ntotal)
+        elif cmd == 'remove':
+            mask = id_map == args
+            if mask.any():
+                index.remove_ids(np.flatnonzero(mask).astype('int64'))
+                id_map = id_map[~mask]
+            conn.send(index.ntotal)
+        elif cmd == 'take':
+            # Hand the vectors of a person over to another shard (cross-shard merge)
+            mask = id_map == args
+            vecs = np.zeros((0, dim), dtype='float32')
+            if mask.any():
+                positions = np.flatnonzero(mask).astype('int64')
+                vecs = np.vstack([index.reconstruct(int(i)) for i in positions])
+                index.remove_ids(positions)
+                id_map = id_map[~mask]
+            conn.send(vecs)
+        elif cmd == 'relabel':
+            old_id, new_id = args
+            id_map[id_map == old_id] = new_id
+            conn.send(index.ntotal)
+        elif cmd == 'search':
+            queries, k = args
+            scores = np.full((len(queries), k), -np.inf, dtype='float32')
+            labels = np.full((len(queries), k), -1, dtype='int64')
+            if index.ntotal:
+                n = min(k, index.ntotal)
+                distances, indices = index.search(queries, n)
+                scores[:, :n] = distances
+                labels[:, :n] = np.where(indices >= 0, id_map[indices], -1)
+            conn.send((scores, labels))
+        elif cmd == 'stats':
+            conn.send({'ntotal': index.ntotal, 'rss_mb': _rss_mb()})
+        elif cmd == 'stop':
+            conn.send(None)
+            break
+
+class ShardedFaceIndex:
+    """
+    Splits the gallery across local worker processes, one FAISS index each.
+    Identities are routed by person_id % num_shards; queries fan out to every shard
+    over a localhost socket and the per-shard top-k lists are merged here.
+    Every vector lives in its owner's shard (merges move vectors), so a shard can be
+    reloaded from the database on its own.
+    """
+
+    def __init__(self, num_shards, dim=512, threads_per_shard=1, db_path=None):
+        self.num_shards = num_shards
+        self.dim = dim
+        self.threads = threads_per_shard
+        # Absolute: workers run with the repo root as their working directory
+        self.db_path = os.path.abspath(db_path) if db_path else None
+        self.counts = Counter()  # person_id -> number of vectors, for cheap lookups without IPC
+
+        # Workers run `python -m core.shard`, not multiprocessing: a spawned child would re-import
+        # the caller's __main__ (main.py pulls in DeepFace/TensorFlow and InsightFace) in every shard
+        pending = [self._spawn(dim, threads_per_shard) for _ in range(num_shards)]
+        self.conns = []
+        self.procs = []
+        self.locks = [threading.Lock() for _ in range(num_shards)]  # One request in flight per connection
+        try:
+            for listener, proc, authkey in pending:
+                self.conns.append(self._accept(listener, proc, authkey))
+                self.procs.append(proc)
+        except BaseException:
+            # Don't leave the workers that did start (or are still starting) running
+            for conn in self.conns:
+                conn.close()
+            for listener, proc, _ in pending:
+                listener.close()
+                if proc.poll() is None:
+                    proc.kill()
+                proc.wait()
+            raise
+
+    def _spawn(self, dim, threads):
+        authkey = os.urandom(32)
+        listener = Listener(('127.0.0.1', 0), authkey=authkey)
+        env = dict(os.environ, SHARD_AUTHKEY=authkey.hex())
+        proc = subprocess.Popen([sys.executable, '-m', 'core.shard', str(listener.address[1]), str(dim), str(threads)],
+                                cwd=ROOT_DIR, env=env)
+        return listener, proc, authkey
+
+    def _accept(self, listener, proc, authkey):
+        address = listener.address
+        connected = threading.Event()
+
+        def wake():
+            # If the worker dies before connecting, unblock accept() ourselves
+            proc.wait()
+            if connected.is_set():
+                return
+            try:
+                Client(address, authkey=authkey).close()
+            except OSError:
+                pass
+        threading.Thread(target=wake, daemon=True).start()
+
+        conn = listener.accept()
+        connected.set()
+        listener.close()
+        if proc.poll() is not None:
+            raise ShardError(f"Shard worker exited with code {proc.returncode} before connecting")
+        return conn
+
+    def shard_of(self, person_id):
+        return person_id % self.num_shards
+
+    @contextmanager
+    def _locked(self, shards):
+        # Always acquire in shard order so concurrent callers can't deadlock
+        shards = sorted(set(shards))
+        for i in shards:
+            self.locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(shards):
+                self.locks[i].release()
+
+    def _roundtrip(self, messages):
+        """messages: [(shard, cmd, args)]. Caller must hold the shards' locks."""
+        # Send everything first so the shards work in parallel, then collect
+        pending = []
+        try:
+            for i, cmd, args in messages:
+                self.conns[i].send((cmd, args))
+                pending.append(i)
+            results = []
+            while pending:
+                i = pending[0]
+                results.append(self.conns[i].recv())
+                pending.pop(0)
+            return results
+        except (EOFError, OSError) as e:
+            # Drain replies from the healthy shards so their sockets stay in sync
+            for j in pending:
+                if j != i:
+                    try:
+                        self.conns[j].recv()
+                    except (EOFError, OSError):
+                        pass
+            proc = self.procs[i]
+            raise ShardError(f"Shard {i} (pid {proc.pid}) is not responding, exit code {proc.poll()}", shard=i) from e
+
+    def _call(self, shards, cmd, args):
+        shards = list(shards)
+        with self._locked(shards):
+            return self._roundtrip([(i, cmd, args) for i in shards])
+
+    def _broadcast(self, cmd, args):
+        return self._call(range(self.num_shards), cmd, args)
+
+    def _prepare(self, embeddings):
+        vecs = np.ascontiguousarray(np.array(embeddings, dtype='float32').reshape(-1, self.dim))
+        faiss.normalize_L2(vecs)
+        return vecs
+
+    def load(self):
+        """Every worker loads its own partition from the database at db_path."""
+        shards = range(self.num_shards)
+        with self._locked(shards):
+            replies = self._roundtrip([(i, 'load', (self.db_path, i, self.num_shards)) for i in shards])
+            self.counts = Counter()
+            for counts in replies:
+                self.counts.update(counts)
+
+    def rebuild_shard(self, shard):
+        """
+        Reloads a single shard from the database. Only that shard's lock is held, but searches
+        need every shard, so they wait for the reload to finish.
+        """
+        with self._locked([shard]):
+            counts = self._roundtrip([(shard, 'load', (self.db_path, shard, self.num_shards))])[0]
+            for pid in [p for p in self.counts if self.shard_of(p) == shard]:
+                del self.counts[pid]
+            self.counts.update(counts)
+
+    def restart_shard(self, shard):
+        """Replaces a dead or stuck worker with a fresh one and reloads its partition."""
+        with self._locked([shard]):
+            old = self.procs[shard]
+            if old.poll() is None:
+                old.kill()
+            old.wait()
+            self.conns[shard].close()
+            listener, proc, authkey = self._spawn(self.dim, self.threads)
+            self.conns[shard] = self._accept(listener, proc, authkey)
+            self.procs[shard] = proc
+        self.rebuild_shard(shard)
+
+    def build(self, known_faces):
+        """Rebuilds every shard from in-memory [(person_id, embedding)], for data not in the database (benchmarks)."""
+        shards = range(self.num_shards)
+        with self._locked(shards):
+            self._roundtrip([(i, 'build', self._partition(i, known_faces)) for i in shards])
+            self.counts = Counter(pid for pid, _ in known_faces)
+
+    def _partition(self, shard, known_faces):
+        rows = [(pid, emb) for pid, emb in known_faces if self.shard_of(pid) == shard]
+        ids = [pid for pid, _ in rows]
+        vecs = self._prepare([emb for _, emb in rows]) if rows else np.zeros((0, self.dim), dtype='float32')
+        return ids, vecs
+
+    def add_faces(self, person_id, embeddings):
+        if not embeddings:
+            return
+        vecs = self._prepare(embeddings)
+        shard = self.shard_of(person_id)
+        with self._locked([shard]):
+            self._roundtrip([(shard, 'add', (person_id, vecs))])
+            self.counts[person_id] += len(vecs)
+
+    def remove_person(self, person_id):
+        shard = self.shard_of(person_id)
+        with self._locked([shard]):
+            self._roundtrip([(shard, 'remove', person_id)])
+            self.counts.pop(person_id, None)
+
+    def relabel_person(self, old_id, new_id):
+        src, dst = self.shard_of(old_id), self.shard_of(new_id)
+        with self._locked([src, dst]):
+            if src == dst:
+                self._roundtrip([(src, 'relabel', (old_id, new_id))])
+            else:
+                # Move the vectors to the target's shard so it stays the single owner
+                vecs = self._roundtrip([(src, 'take', old_id)])[0]
+                if len(vecs):
+                    self._roundtrip([(dst, 'add', (new_id, vecs))])
+            self.counts[new_id] += self.counts.pop(old_id, 0)
+
+    def has_person(self, person_id):
+        return self.counts.get(person_id, 0) > 0
+
+    @property
+    def ntotal(self):
+        return sum(self.counts.values())
+
+    def memory_usage(self):
+        """Per-shard resident memory in MB (None where it can't be measured)."""
+        return [stats['rss_mb'] for stats in self._broadcast('stats', None)]
+
+    def search(self, queries, k=1):
+        """Returns (scores, person_ids), both shaped (n_queries, k); missing hits are -1."""
+        queries = np.ascontiguousarray(np.asarray(queries, dtype='float32').reshape(-1, self.dim))
+        results = self._broadcast('search', (queries, k))
+        scores = np.concatenate([r[0] for r in results], axis=1)
+        labels = np.concatenate([r[1] for r in results], axis=1)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, top, axis=1), np.take_along_axis(labels, top, axis=1)
+
+    def close(self, timeout=5.0):
+        for conn, proc in zip(self.conns, self.procs):
+            if proc.poll() is None:
+                try:
+                    conn.send(('stop', None))
+                    # A worker that is alive but stuck would block recv() forever
+                    if conn.poll(timeout):
+                        conn.recv()
+                    else:
+                        proc.kill()
+                except (EOFError, OSError):
+                    proc.kill()
+            conn.close()
+            proc.wait()
+
+if __name__ == "__main__":
+    # Shard worker entry point, started by ShardedFaceIndex: python -m core.shard <port> <dim> <threads>
+    port, dim, threads = map(int, sys.argv[1:4])
+    conn = Client(('127.0.0.1', port), authkey=bytes.fromhex(os.environ['SHARD_AUTHKEY']))
+    _shard_worker(conn, dim, threads)
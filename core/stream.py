@@ -0,0 +1,100 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+BOUNDARY = "frame"
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        streamer = self.server.streamer
+        if self.path == "/":
+            page = b'<html><body style="margin:0;background:#000"><img src="/stream.mjpg" style="width:100%"/></body></html>'
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+        elif self.path == "/stream.mjpg":
+            self.send_response(200)
+            self.send_header("Cache-Control", "no-cache, private")
+            self.send_header("Pragma", "no-cache")
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            self.end_headers()
+            last_seq = 0
+            try:
+                while not streamer.stopped:
+                    # Always jump to the newest JPEG: a slow client just skips frames
+                    jpeg, last_seq = streamer.wait_for_jpeg(last_seq)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(f"--{BOUNDARY}\r\n".encode())
+                    self.wfile.write(b"Content-Type: image/jpeg\r\n")
+                    self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b"\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Viewer went away
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console clean, one line per request is too noisy
+
+class MJPEGStreamer:
+    """Serves annotated frames as an MJPEG stream on http://host:port/stream.mjpg"""
+
+    def __init__(self, host='127.0.0.1', port=8080, quality=80):
+        self.quality = quality
+        self.stopped = False
+
+        # Latest raw frame handed over by the vision loop
+        self.frame = None
+        self.frame_ready = threading.Event()
+
+        # Latest encoded JPEG shared by every client, tagged with a sequence number
+        self.jpeg = None
+        self.seq = 0
+        self.cond = threading.Condition()
+
+        self.server = ThreadingHTTPServer((host, port), _StreamHandler)
+        self.server.daemon_threads = True
+        self.server.streamer = self
+
+    def start(self):
+        threading.Thread(target=self.encode, args=(), daemon=True).start()
+        threading.Thread(target=self.server.serve_forever, args=(), daemon=True).start()
+        return self
+
+    def update(self, frame):
+        # Never blocks: if the encoder is busy, the previous frame is simply replaced
+        self.frame = frame
+        self.frame_ready.set()
+
+    def encode(self):
+        while not self.stopped:
+            if not self.frame_ready.wait(timeout=0.5):
+                continue
+            self.frame_ready.clear()
+            frame = self.frame
+            ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            with self.cond:
+                self.jpeg = buf.tobytes()
+                self.seq += 1
+                self.cond.notify_all()
+
+    def wait_for_jpeg(self, last_seq, timeout=1.0):
+        """Returns (jpeg, seq) for the newest frame after last_seq, or (None, last_seq) on timeout."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq or self.stopped, timeout=timeout)
+            if self.seq == last_seq:
+                return None, last_seq
+            return self.jpeg, self.seq
+
+    def stop(self):
+        self.stopped = True
+        with self.cond:
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
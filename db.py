@@ -3,6 +3,7 @@ import os
 import pickle
 
 DB_PATH = 'vision_memory.db'
+CHANGE_LOG_RETENTION_HOURS = 24  # Readers poll every second, older rows are never needed again
 
 def get_known_faces():
     conn = sqlite3.connect(DB_PATH)
@@ -12,6 +13,50 @@ def get_known_faces():
     conn.close()
     return data
 
+def get_known_faces_partition(shard, num_shards):
+    """Rows of one search shard (person_id % num_shards == shard), loaded by the shard worker itself."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT person_id, encoding FROM face_encodings WHERE person_id % ? = ?", (num_shards, shard))
+    data = [(pid, pickle.loads(blob)) for pid, blob in c.fetchall()]
+    conn.close()
+    return data
+
+def get_person_encodings(person_id):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT encoding FROM face_encodings WHERE person_id=?", (person_id,))
+    data = [pickle.loads(blob) for (blob,) in c.fetchall()]
+    conn.close()
+    return data
+
+def log_gallery_change(conn, op, person_id, other_id=None):
+    # Written in the same transaction as the mutation, so readers never see one without the other
+    conn.execute("INSERT INTO gallery_changes (op, person_id, other_id) VALUES (?, ?, ?)",
+                 (op, person_id, other_id))
+
+def get_gallery_changes(since_seq):
+    """Returns [(seq, op, person_id, other_id)] recorded after since_seq, oldest first."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT seq, op, person_id, other_id FROM gallery_changes WHERE seq > ? ORDER BY seq", (since_seq,))
+    data = c.fetchall()
+    conn.close()
+    return data
+
+def get_last_change_seq():
+    conn = sqlite3.connect(DB_PATH)
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM gallery_changes").fetchone()[0]
+    conn.close()
+    return seq
+
+def prune_gallery_changes(max_age_hours=CHANGE_LOG_RETENTION_HOURS):
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("DELETE FROM gallery_changes WHERE created_at < datetime('now', ?)",
+                 (f"-{max_age_hours} hours",))
+    conn.commit()
+    conn.close()
+
 def create_new_person(encoding):
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
@@ -19,6 +64,7 @@ def create_new_person(encoding):
     new_id = c.lastrowid
     c.execute("INSERT INTO face_encodings (person_id, encoding) VALUES (?, ?)", 
               (new_id, pickle.dumps(encoding)))
+    log_gallery_change(conn, 'create', new_id)
     conn.commit()
     conn.close()
     return new_id
@@ -48,6 +94,7 @@ def update_thumbnail_path(person_id, path):
 def update_name(person_id, new_name):
     conn = sqlite3.connect(DB_PATH)
     conn.execute("UPDATE people SET name=? WHERE id=?", (new_name, person_id))
+    log_gallery_change(conn, 'rename', person_id)
     conn.commit()
     conn.close()
 
@@ -55,7 +102,9 @@ def delete_person(person_id, thumbnail_path):
     conn = sqlite3.connect(DB_PATH)
     conn.execute("DELETE FROM people WHERE id=?", (person_id,))
     conn.execute("DELETE FROM face_encodings WHERE person_id=?", (person_id,))
+    log_gallery_change(conn, 'delete', person_id)
     conn.commit()
+    conn.close()
     if thumbnail_path and os.path.exists(thumbnail_path):
         os.remove(thumbnail_path)
         
@@ -75,6 +124,7 @@ def merge_identities(target_id, source_id):
         os.remove(res[0])
         
     conn.execute("DELETE FROM people WHERE id=?", (source_id,))
+    log_gallery_change(conn, 'merge', target_id, source_id)
     conn.commit()
     conn.close()
     
@@ -88,6 +138,12 @@ def init_db():
     c.execute('''CREATE TABLE IF NOT EXISTS face_encodings
                  (person_id INTEGER, encoding BLOB, FOREIGN KEY(person_id) REFERENCES people(id))''')
     
+    # Append-only log of gallery mutations, tailed by main.py to patch its index live
+    # op: 'create' | 'rename' | 'delete' (person_id) or 'merge' (other_id merged into person_id)
+    c.execute('''CREATE TABLE IF NOT EXISTS gallery_changes
+                 (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT, person_id INTEGER, other_id INTEGER,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    
     c.execute('''CREATE TABLE IF NOT EXISTS settings
                  (key TEXT PRIMARY KEY, value TEXT)
               ''')
@@ -95,9 +151,13 @@ def init_db():
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('enable_privacy_cloak', 'False')")
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('enable_hud', 'True')")
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('show_landmarks', 'False')")
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('output_mode', 'window')")
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('stream_port', '8080')")
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('embed_stream', 'False')")
                   
     conn.commit()
     conn.close()
+    prune_gallery_changes()
     
 def set_approval(person_id, status):
     # status should be 1 for approved, 0 for cloaked
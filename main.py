@@ -1,14 +1,21 @@
+import time
 import cv2
 from core.ui import draw_cyberpunk_hud, draw_dense_mesh
 import db
 import numpy as np
 from core.camera import WebcamStream
 from core.face import FaceEngine
+from core.shard import ShardError
+from core.stream import MJPEGStreamer
 from collections import deque, Counter
 from deepface import DeepFace
 
 # --- CONFIG ---
 SMOOTHING_WINDOW = 10  # Number of frames to remember for smoothing
+CHANGE_POLL_INTERVAL = 1.0  # Seconds between reads of the gallery change log
+CHANGE_PRUNE_INTERVAL = 3600  # Seconds between prunes of old change log rows
+SEARCH_SHARDS = 0  # >0 splits the gallery search across that many worker processes (core/shard.py)
+SEARCH_THREADS_PER_SHARD = 1  # OpenMP threads per shard worker; shards x threads should not exceed the CPU count
 
 # This dictionary will store: {person_id: {'age': deque, 'gender': deque}}
 history = {}
@@ -36,16 +43,75 @@ def get_smoothed_attributes(person_id, raw_age, raw_gender, raw_emotion):
         
     return smooth_age, smooth_gender, smooth_emo
 
+# {person_id: name}, filled lazily and patched from the gallery change log
+name_cache = {}
+def get_cached_name(person_id):
+    if person_id not in name_cache:
+        name_cache[person_id] = db.get_person_name(person_id)
+    return name_cache[person_id]
+
+def apply_gallery_changes(engine, changes):
+    """Applies manager.py edits (db.gallery_changes rows) to the live index and caches."""
+    for seq, op, person_id, other_id in changes:
+        if op == 'create':
+            # Our own inserts are already indexed; only pick up ones made elsewhere
+            if not engine.has_person(person_id):
+                engine.add_faces(person_id, db.get_person_encodings(person_id))
+        elif op == 'rename':
+            name_cache.pop(person_id, None)
+        elif op == 'delete':
+            engine.remove_person(person_id)
+            name_cache.pop(person_id, None)
+            history.pop(person_id, None)
+        elif op == 'merge':
+            if engine.has_person(other_id):
+                engine.relabel_person(other_id, person_id)
+            else:
+                # The source was never indexed here (e.g. created and merged between two polls):
+                # its rows already belong to the target, so reload the target from the database
+                engine.remove_person(person_id)
+                engine.add_faces(person_id, db.get_person_encodings(person_id))
+            name_cache.pop(other_id, None)
+            history.pop(other_id, None)
+
 def main():
     db.init_db()
-    engine = FaceEngine(model_name='buffalo_s')
+    engine = FaceEngine(model_name='buffalo_s', num_shards=SEARCH_SHARDS,
+                        threads_per_shard=SEARCH_THREADS_PER_SHARD, db_path=db.DB_PATH)
     video_stream = WebcamStream(src=0).start()
     
-    known_faces_cache = db.get_known_faces()
-    engine.update_search_index(known_faces_cache)
+    # Output: 'window' uses cv2.imshow, 'stream' serves MJPEG on localhost (headless)
+    headless = db.get_setting("output_mode") == "stream"
+    streamer = None
+    if headless:
+        streamer = MJPEGStreamer(port=int(db.get_setting("stream_port") or 8080)).start()
+        print(f"Streaming on http://127.0.0.1:{streamer.server.server_port}/stream.mjpg (Ctrl+C to stop)")
+    
+    # Read the log position first: anything logged while loading is replayed against the current DB state
+    last_change_seq = db.get_last_change_seq()
+    if SEARCH_SHARDS:
+        engine.load_shards()  # Workers read their own partitions, this process never holds the gallery
+    else:
+        known_faces_cache = db.get_known_faces()
+        engine.update_search_index(known_faces_cache)
     
+    try:
+        run_loop(engine, video_stream, streamer, last_change_seq)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        video_stream.stop()
+        engine.close()
+        if streamer:
+            streamer.stop()
+        else:
+            cv2.destroyAllWindows()
+
+def run_loop(engine, video_stream, streamer, last_change_seq):
     frame_count = 0
     approved_ids = []
+    last_poll = 0.0
+    last_prune = time.monotonic()  # init_db() just pruned
 
     while True:
         frame = video_stream.read()
@@ -60,6 +126,21 @@ def main():
             hud_active = db.get_setting("enable_hud") == "True"
             show_landmarks = db.get_setting("show_landmarks") == "True"
 
+        # Tail the gallery change log instead of reloading every face.
+        # Wall-clock based: with detection + DeepFace in the loop, 30 frames can take many seconds
+        now = time.monotonic()
+        if now - last_poll >= CHANGE_POLL_INTERVAL:
+            last_poll = now
+            changes = db.get_gallery_changes(last_change_seq)
+            if changes:
+                apply_gallery_changes(engine, changes)
+                last_change_seq = changes[-1][0]
+
+        # The log gets a row for every new face, keep it bounded
+        if now - last_prune >= CHANGE_PRUNE_INTERVAL:
+            last_prune = now
+            db.prune_gallery_changes()
+
         frame_count += 1
         # 2. Get Faces
         faces = engine.get_face_features(output_frame)
@@ -68,7 +149,12 @@ def main():
             bbox = face['bbox'].astype(int)
             x1, y1, x2, y2 = np.clip(bbox, 0, [frame.shape[1], frame.shape[0], frame.shape[1], frame.shape[0]])
             
-            person_id, confidence = engine.search_face(face['embedding'])
+            try:
+                person_id, confidence = engine.search_face(face['embedding'])
+            except ShardError as e:
+                print(f"{e}, restarting it")
+                engine.restart_shard(e.shard)
+                person_id, confidence = engine.search_face(face['embedding'])
             
             # --- IDENTITY & EMOTION ---
             current_emotion = "Neutral"
@@ -82,10 +168,10 @@ def main():
             if not person_id:
                 person_id = db.create_new_person(face['embedding'])
                 cv2.imwrite(f"captures/person_{person_id}.jpg", frame[y1:y2, x1:x2])
-                engine.update_search_index(db.get_known_faces())
+                engine.add_faces(person_id, [face['embedding']])
                 db.update_thumbnail_path(person_id, f"captures/person_{person_id}.jpg")
             
-            name = db.get_person_name(person_id)
+            name = get_cached_name(person_id)
             age, gender, emotion = get_smoothed_attributes(person_id, face['age'], face['gender'], current_emotion)
             
             gender = "Male" if gender == 1 else "Female"
@@ -112,13 +198,14 @@ def main():
                 cv2.putText(output_frame, "UNAUTHORIZED", (x1, y1-10), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
 
+        if streamer:
+            streamer.update(output_frame)
+            continue
+
         cv2.imshow('Selective Privacy Shield', output_frame)
         
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
-
-    video_stream.stop()
-    cv2.destroyAllWindows()
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
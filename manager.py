@@ -8,10 +8,13 @@ from core.face import FaceEngine
 
 os.add_dll_directory(r"C:\Program Files\NVIDIA GPU Computing Toolkit\CUDA\v12.6\bin")
 
-from db import delete_person, delete_person, get_known_faces, get_people_count, get_people_info, get_setting, merge_identities, set_approval, set_setting, update_name
+from db import delete_person, delete_person, get_known_faces, get_people_count, get_people_info, get_setting, init_db, merge_identities, set_approval, set_setting, update_name
 
 st.set_page_config(page_title="Vision Manager", layout="wide")  
 
+# Idempotent: creates tables added since the database was first built (e.g. gallery_changes)
+init_db()
+
 @st.fragment(run_every="3s")
 def refresh_people_list():
     data = get_people_info()
@@ -178,9 +181,36 @@ if st.sidebar.toggle("📍 Show Facial Landmarks", value=landmark_status):
 else:
     set_setting("show_landmarks", "False")
 
+#4. Output Mode (read by main.py at startup)
+output_modes = ["window", "stream"]
+current_mode = get_setting("output_mode")
+mode_index = output_modes.index(current_mode) if current_mode in output_modes else 0
+output_mode = st.sidebar.selectbox("🖥️ Output Mode", output_modes, index=mode_index,
+                                   help="'stream' runs main.py headless and serves MJPEG on localhost. Restart main.py to apply.")
+set_setting("output_mode", output_mode)
+
+stream_port = st.sidebar.number_input("Stream Port", min_value=1024, max_value=65535, step=1,
+                                      value=int(get_setting("stream_port") or 8080))
+set_setting("stream_port", str(stream_port))
+
+#5. Embed Live Stream Toggle
+embed_status = get_setting("embed_stream") == "True"
+if st.sidebar.toggle("📺 Embed Live Stream", value=embed_status):
+    set_setting("embed_stream", "True")
+else:
+    set_setting("embed_stream", "False")
+
 st.sidebar.divider()
 # -------------------------------
 
+if get_setting("embed_stream") == "True":
+    if get_setting("output_mode") == "stream":
+        # The browser pulls the MJPEG directly from main.py, Streamlit never touches the frames
+        st.markdown(f'<img src="http://localhost:{stream_port}/stream.mjpg" style="width:100%; max-width:960px"/>',
+                    unsafe_allow_html=True)
+    else:
+        st.info("Set Output Mode to 'stream' and restart main.py to see the live feed here.")
+
 tab_main, tab_smart_merge, tab_merge = st.tabs(["Identify & Name", "Smart Deduplication", "Merge Maintenance"])
 
 with tab_main: